@@ -1,3 +1,13 @@
+import heapq
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+RUN_BENCHMARK = False
+
+
 class Elf:
     def __init__(self, name):
         self.name = name
@@ -10,23 +20,190 @@ class Bag(list):
         return sum(self)
 
 
-elves = []
+def top_calories(filename, k=3):
+    """
+    Reads the calorie ledger once, only keeping the running sum of the current elf
+    and a heap of the k best bags met so far.
+
+    Returns the k best bags as (elf name, calories), most calories first, and the
+    total calories carried by all the elves.
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1")
+
+    best = []
+    total = 0
+    with open(filename, encoding="utf-8") as file:
+        index = 1
+        current = 0
+        for line in file:
+            try:
+                current += int(line)
+            except ValueError:
+                _keep_best(best, k, current, index)
+                total += current
+                index += 1
+                current = 0
+        _keep_best(best, k, current, index)
+        total += current
+
+    return [(f"Elf #{-index}", calories)
+            for calories, index in sorted(best, reverse=True)], total
+
+
+def _keep_best(heap, k, calories, index):
+    # negated index so that, on a tie, the first elf of the ledger wins like a stable sort would
+    if len(heap) < k:
+        heapq.heappush(heap, (calories, -index))
+    elif (calories, -index) > heap[0]:
+        heapq.heapreplace(heap, (calories, -index))
+
+
+def parallel_top_calories(filename, k=3, workers=None):
+    """
+    Same as top_calories, but the ledger is split in byte ranges that are summed by a pool
+    of worker processes. Each split is snapped after the next blank line, and the elf opened
+    at the end of a chunk is stitched with the beginning of the next one when merging.
+    """
+    if k < 1:
+        raise ValueError("k must be at least 1")
+
+    workers = workers or os.cpu_count()
+    boundaries = _elf_boundaries(filename, workers)
+    chunks = [(filename, start, end, k) for start, end in zip(boundaries, boundaries[1:])]
+    if workers == 1:
+        results = [_sum_chunk(*chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_sum_chunk, *zip(*chunks)))
+
+    best = []
+    total = 0
+    index = 1
+    current = 0
+    for head, chunk_best, separators, tail, chunk_total in results:
+        total += chunk_total
+        current += head
+        if not separators:
+            continue
+        _keep_best(best, k, current, index)
+        for calories, local_index in chunk_best:
+            _keep_best(best, k, calories, index - local_index)
+        index += separators
+        current = tail
+    _keep_best(best, k, current, index)
+
+    return [(f"Elf #{-index}", calories)
+            for calories, index in sorted(best, reverse=True)], total
+
+
+def _elf_boundaries(filename, workers):
+    size = os.path.getsize(filename)
+    boundaries = {0, size}
+    with open(filename, "rb") as file:
+        for i in range(1, workers):
+            file.seek(size * i // workers)
+            file.readline()
+            for line in iter(file.readline, b""):
+                if not line.strip():
+                    break
+            boundaries.add(file.tell())
+    return sorted(boundaries)
+
+
+def _sum_chunk(filename, start, end, k):
+    """
+    Sums the elves of the [start, end) byte range of the ledger, the range being aligned on lines.
+
+    Returns the calories before the first separator (belonging to an elf opened in a previous
+    chunk), the k best elves fully enclosed in the chunk with their negated index relative to the
+    chunk, the number of separators, the calories after the last separator and the chunk total.
+    """
+    best = []
+    head = None
+    separators = 0
+    current = 0
+    total = 0
+    with open(filename, "rb") as file:
+        file.seek(start)
+        position = start
+        for line in file:
+            if position >= end:
+                break
+            position += len(line)
+            try:
+                current += int(line)
+            except ValueError:
+                if head is None:
+                    head = current
+                else:
+                    _keep_best(best, k, current, separators)
+                total += current
+                separators += 1
+                current = 0
+    total += current
+    if head is None:
+        head = current
+    return head, best, separators, current, total
+
+
+def benchmark(lines=5_000_000, workers=None):
+    """Prints the time spent on a synthetic ledger for every number of workers from 1 to workers"""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+        for _ in range(lines):
+            file.write(f"{random.randint(1000, 70000)}\n" if random.random() > 0.2 else "\n")
+    try:
+        start = time.perf_counter()
+        expected = top_calories(file.name)
+        print(f"sequential: {time.perf_counter() - start:.2f}s")
+        for count in range(1, (workers or os.cpu_count()) + 1):
+            start = time.perf_counter()
+            assert parallel_top_calories(file.name, workers=count) == expected
+            print(f"{count} worker(s): {time.perf_counter() - start:.2f}s")
+    finally:
+        os.unlink(file.name)
+
+
+if __name__ == "__main__":
+    test_top, test_total = top_calories("test.txt", k=3)
+    assert test_top == [("Elf #4", 24000), ("Elf #3", 11000), ("Elf #5", 10000)]
+    assert test_total == 55000
+    assert top_calories("test.txt", k=1)[0] == [("Elf #4", 24000)]
+    assert len(top_calories("test.txt", k=10)[0]) == 5
+    for test_workers in range(1, 8):
+        assert (parallel_top_calories("test.txt", k=3, workers=test_workers)
+                == (test_top, test_total))
+
+    elves = []
+
+    with open('input.txt') as fp:
+        elves.append(Elf("Elf #1"))
+        for line in fp:
+            try:
+                elves[-1].bag.append(int(line.strip()))
+            except ValueError:
+                elves.append(Elf("Elf #" + str(len(elves) + 1)))
+
+    elf_top_calory = sorted(elves, key=lambda x: x.bag.calories, reverse=True)[0]
+    print(f"{elf_top_calory.name} is the elf with the most calories "
+          f"({elf_top_calory.bag.calories})")
+
+    top_3_elves = sorted(elves, key=lambda x: x.bag.calories, reverse=True)[:3]
+    print("Top 3 calorie hoarders:")
+    for elf in top_3_elves:
+        print(f" - {elf_top_calory.name} ({elf_top_calory.bag.calories})")
 
-with open('input.txt') as fp:
-    elves.append(Elf("Elf #1"))
-    for line in fp:
-        try:
-            elves[-1].bag.append(int(line.strip()))
-        except ValueError:
-            elves.append(Elf("Elf #" + str(len(elves) + 1)))
+    top_3_calories = sum([elf.bag.calories for elf in top_3_elves])
+    print(f"That’s a total of {top_3_calories}")
 
-elf_top_calory = sorted(elves, key=lambda x: x.bag.calories, reverse=True)[0]
-print(f"{elf_top_calory.name} is the elf with the most calories ({elf_top_calory.bag.calories})")
+    top_3, total_calories = top_calories("input.txt", k=3)
+    assert top_3 == [(elf.name, elf.bag.calories) for elf in top_3_elves]
+    assert sum(calories for _, calories in top_3) == top_3_calories
+    assert total_calories == sum(elf.bag.calories for elf in elves)
 
-top_3_elves = sorted(elves, key=lambda x: x.bag.calories, reverse=True)[:3]
-print("Top 3 calorie hoarders:")
-for elf in top_3_elves:
-    print(f" - {elf_top_calory.name} ({elf_top_calory.bag.calories})")
+    for workers_count in range(1, 5):
+        assert (parallel_top_calories("input.txt", k=3, workers=workers_count)
+                == (top_3, total_calories))
 
-top_3_calories = sum([elf.bag.calories for elf in top_3_elves])
-print(f"That’s a total of {top_3_calories}")
+    if RUN_BENCHMARK:
+        benchmark()
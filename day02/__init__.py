@@ -1,4 +1,6 @@
 from enum import Enum
+from functools import partial
+from itertools import permutations
 
 
 class Outcome(Enum):
@@ -83,6 +85,77 @@ def compute_phase2(filename):
     return score
 
 
+THEIRS = b"ABC"
+OURS = b"XYZ"
+PLAYS = [Play.ROCK, Play.PAPER, Play.SCISSOR]
+OUTCOMES = [Outcome.LOSS, Outcome.DRAW, Outcome.WIN]
+
+
+def mapping_table(mapping):
+    """
+    Score of each possible line, indexed by [theirs][ours], when X, Y and Z respectively
+    stand for the 3 plays or outcomes of the given mapping
+    """
+    return [[_line_score(theirs, meaning) for meaning in mapping] for theirs in PLAYS]
+
+
+def _line_score(theirs, meaning):
+    if isinstance(meaning, Outcome):
+        ours = next(play for play in PLAYS if play.check(theirs) == meaning)
+        return meaning.value + ours.value
+    return meaning.value + meaning.check(theirs).value
+
+
+PHASE1_TABLE = mapping_table(PLAYS)
+PHASE2_TABLE = mapping_table(OUTCOMES)
+ALL_MAPPINGS = [*permutations(PLAYS), tuple(OUTCOMES)]
+
+
+def read_histogram(filename, block_size=1 << 24):
+    """
+    Counts the occurrences of each of the 9 possible lines of a strategy guide,
+    straight from the raw bytes, block after block.
+    Returns a 3x3 matrix indexed by [theirs][ours].
+    """
+    histogram = [[0] * 3 for _ in THEIRS]
+    rest = b""
+    with open(filename, "rb") as file:
+        for block in iter(partial(file.read, block_size), b""):
+            block = rest + block
+            cut = block.rfind(b"\n") + 1
+            _count_lines(histogram, block[:cut])
+            rest = block[cut:]
+    _count_lines(histogram, rest)
+    return histogram
+
+
+def _count_lines(histogram, block):
+    for i, theirs in enumerate(THEIRS):
+        for j, ours in enumerate(OURS):
+            histogram[i][j] += block.count(bytes((theirs, 32, ours)))
+
+
+def score(histogram, table):
+    return sum(count * points
+               for counts, scores in zip(histogram, table)
+               for count, points in zip(counts, scores))
+
+
+def compute_phases(filename):
+    histogram = read_histogram(filename)
+    return score(histogram, PHASE1_TABLE), score(histogram, PHASE2_TABLE)
+
+
+def score_mappings(filename, mappings=None):
+    """
+    Reads the guide once, and returns the score of every mapping (all the plays permutations and
+    the outcomes by default), each mapping being a (X, Y, Z) tuple of plays or outcomes
+    """
+    histogram = read_histogram(filename)
+    return {tuple(mapping): score(histogram, mapping_table(mapping))
+            for mapping in mappings or ALL_MAPPINGS}
+
+
 assert Play.SCISSOR > Play.PAPER
 assert Play.PAPER > Play.ROCK
 assert Play.ROCK > Play.SCISSOR
@@ -110,3 +183,19 @@ assert (
 
 real = compute_phase2("input.txt")
 print(f"Computed score in phase2: {real}")
+
+assert read_histogram("test.txt") == [[0, 1, 0], [1, 0, 0], [0, 0, 1]]
+assert read_histogram("test.txt", block_size=3) == read_histogram("test.txt")
+assert compute_phases("test.txt") == (15, 12)
+test_scores = score_mappings("test.txt")
+assert len(test_scores) == 7
+assert test_scores[(Play.ROCK, Play.PAPER, Play.SCISSOR)] == 15
+assert test_scores[(Outcome.LOSS, Outcome.DRAW, Outcome.WIN)] == 12
+assert score_mappings("test.txt", [(Play.ROCK, Play.ROCK, Play.ROCK)]) == {
+    (Play.ROCK, Play.ROCK, Play.ROCK): 1 + 6 + 1 + 0 + 1 + 3
+}
+assert score_mappings("test.txt", [(Outcome.WIN, Play.PAPER, Outcome.LOSS)]) == {
+    (Outcome.WIN, Play.PAPER, Outcome.LOSS): 2 + 6 + 3 + 6 + 2 + 0
+}
+
+assert compute_phases("input.txt") == (compute_phase1("input.txt"), real)
@@ -1,3 +1,10 @@
+import time
+import tracemalloc
+from string import ascii_lowercase, ascii_uppercase
+
+RUN_BENCHMARK = False
+
+
 class Item:
     """
     An item found in the elve’s rucksacks.
@@ -75,6 +82,75 @@ def groups_common_priority_accumulator(filename):
     return score
 
 
+PRIORITIES = {letter: priority
+              for priority, letter in enumerate(ascii_lowercase + ascii_uppercase, start=1)}
+ALL_ITEMS = (1 << len(PRIORITIES)) - 1
+
+
+def item_mask(content):
+    """
+    A compartment packed as a 52 bits integer, where the bit of rank priority - 1 is set for each
+    present item, so that intersections are bitwise ands
+    """
+    mask = 0
+    for letter in set(content):
+        mask |= 1 << (PRIORITIES[letter] - 1)
+    return mask
+
+
+def mask_priority(mask):
+    """Sum of the priorities of the items set in a mask"""
+    score = 0
+    while mask:
+        lowest = mask & -mask
+        score += lowest.bit_length()
+        mask ^= lowest
+    return score
+
+
+def priority_accumulators(filename):
+    """
+    Single pass version of both individual_common_items_priority_accumulator and
+    groups_common_priority_accumulator, working on masks instead of Item objects
+    """
+    individual = groups = 0
+    group = ALL_ITEMS
+    with open(filename, encoding="utf-8") as file:
+        for index, line in enumerate(file, start=1):
+            line = line.strip()
+            pivot = len(line) // 2
+            comp1 = item_mask(line[:pivot])
+            comp2 = item_mask(line[pivot:])
+            individual += mask_priority(comp1 & comp2)
+            group &= comp1 | comp2
+            if index % 3 == 0:
+                groups += mask_priority(group)
+                group = ALL_ITEMS
+    return individual, groups
+
+
+def benchmark(filename="input.txt", rounds=20):
+    """Compares the time and peak memory of the Rucksack accumulators against the masks one"""
+    def measure(accumulator):
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            accumulator(filename)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
+
+    for name, accumulator in [
+        ("Rucksack", lambda f: (individual_common_items_priority_accumulator(f),
+                                groups_common_priority_accumulator(f))),
+        ("masks", priority_accumulators),
+    ]:
+        elapsed, peak = measure(accumulator)
+        print(f"{name}: {elapsed / rounds * 1000:.2f}ms per run, "
+              f"{peak / 1024:.1f}KiB peak allocation")
+
+
 assert Item("a").priority == 1
 assert Item("z").priority == 26
 assert Item("A").priority == 27
@@ -88,8 +164,22 @@ assert s.common_in_both_compartments[0] == Item("p")
 assert individual_common_items_priority_accumulator("test.txt") == 157
 assert groups_common_priority_accumulator("test2.txt") == 70
 
+assert item_mask("a") == 1
+assert item_mask("Z") == 1 << 51
+assert item_mask("abca") == 0b111
+assert mask_priority(item_mask("aZ")) == 53
+assert mask_priority(item_mask("vJrwpWtwJgWr") & item_mask("hcsFMMfFFhFp")) == 16
+assert priority_accumulators("test.txt")[0] == 157
+assert priority_accumulators("test2.txt")[1] == 70
+
 result = individual_common_items_priority_accumulator("input.txt")
 print(f"Total priority for item present in both rucksack is : {result}")
 
 result = groups_common_priority_accumulator("input.txt")
 print(f"Total priority for common item present in 3 elfs groups is : {result}")
+
+assert priority_accumulators("input.txt") == (
+    individual_common_items_priority_accumulator("input.txt"), result)
+
+if RUN_BENCHMARK:
+    benchmark()
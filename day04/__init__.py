@@ -1,3 +1,11 @@
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import combinations
+
+RUN_BENCHMARK = False
+
+
 class Section:
     def __init__(self, low, high):
         self.low = int(low)
@@ -54,6 +62,155 @@ def count_overlaps(filename):
     return count
 
 
+def fully_contains(low1, high1, low2, high2):
+    return low1 <= low2 and high2 <= high1 or low2 <= low1 and high1 <= high2
+
+
+def overlaps(low1, high1, low2, high2):
+    return low1 <= high2 and low2 <= high1
+
+
+class Assignments:
+    """
+    All the assignments of a file, parsed once into four integer columns.
+    Predicates receive (low1, high1, low2, high2) and are called once per row, in a single pass
+    over the zipped columns: this is plain Python iteration, not vectorized evaluation.
+    """
+    predicates = {
+        "fully_contains": fully_contains,
+        "overlaps": overlaps,
+    }
+
+    def __init__(self, low1, high1, low2, high2):
+        self.low1 = low1
+        self.high1 = high1
+        self.low2 = low2
+        self.high2 = high2
+
+    def __len__(self):
+        return len(self.low1)
+
+    @property
+    def columns(self):
+        return self.low1, self.high1, self.low2, self.high2
+
+    @classmethod
+    def read(cls, filename):
+        with open(filename, encoding="utf-8") as file:
+            numbers = array("l", map(int, file.read().replace(",", " ").replace("-", " ").split()))
+        return cls(numbers[0::4], numbers[1::4], numbers[2::4], numbers[3::4])
+
+    def count(self, predicate):
+        return sum(map(predicate, *self.columns))
+
+    def counts(self, **predicates):
+        """Every count in one pass over the rows, for the given named predicates or the defaults"""
+        predicates = predicates or self.predicates
+        counts = dict.fromkeys(predicates, 0)
+        for row in zip(*self.columns):
+            for name, predicate in predicates.items():
+                if predicate(*row):
+                    counts[name] += 1
+        return counts
+
+
+class _IntervalNode:
+    """A centered interval tree node, holding the sections containing its center"""
+    def __init__(self, sections):
+        self.center = sorted(section.low for section in sections)[len(sections) // 2]
+        left = [section for section in sections if section.high < self.center]
+        right = [section for section in sections if section.low > self.center]
+        here = [section for section in sections if section.low <= self.center <= section.high]
+        self.by_low = sorted(here, key=lambda section: section.low)
+        self.by_high = sorted(here, key=lambda section: section.high, reverse=True)
+        self.left = _IntervalNode(left) if left else None
+        self.right = _IntervalNode(right) if right else None
+
+
+class SectionIndex:
+    """
+    An index over many sections, answering cross-sections queries without comparing every pair:
+    counts come from sorted endpoints and bisect, listings from a centered interval tree.
+    """
+    def __init__(self, sections):
+        self.sections = list(sections)
+        self.lows = sorted(section.low for section in self.sections)
+        self.highs = sorted(section.high for section in self.sections)
+        self.root = _IntervalNode(self.sections) if self.sections else None
+
+    def __len__(self):
+        return len(self.sections)
+
+    @classmethod
+    def read(cls, filename):
+        sections = []
+        with open(filename, encoding="utf-8") as file:
+            for line in file:
+                assignment = Assignment(line)
+                sections.extend((assignment.section1, assignment.section2))
+        return cls(sections)
+
+    def coverage(self, point):
+        """Number of sections containing point"""
+        return bisect_right(self.lows, point) - bisect_left(self.highs, point)
+
+    def count_overlapping(self, low, high):
+        """Number of sections sharing at least one id with low-high"""
+        return bisect_right(self.lows, high) - bisect_left(self.highs, low)
+
+    def stabbing(self, point):
+        """Sections containing point"""
+        return self.overlapping(point, point)
+
+    def overlapping(self, low, high):
+        """Sections sharing at least one id with low-high"""
+        found = []
+        nodes = [self.root] if self.root else []
+        while nodes:
+            node = nodes.pop()
+            if high < node.center:
+                for section in node.by_low:
+                    if section.low > high:
+                        break
+                    found.append(section)
+                nodes.append(node.left)
+            elif low > node.center:
+                for section in node.by_high:
+                    if section.high < low:
+                        break
+                    found.append(section)
+                nodes.append(node.right)
+            else:
+                found.extend(node.by_low)
+                nodes.extend((node.left, node.right))
+            nodes = [node for node in nodes if node]
+        return found
+
+    def pairwise_overlaps(self):
+        """Number of overlapping pairs of sections, as all the pairs minus the disjoint ones"""
+        size = len(self)
+        disjoint = sum(size - bisect_right(self.lows, high) for high in self.highs)
+        return size * (size - 1) // 2 - disjoint
+
+
+def naive_pairwise_overlaps(sections):
+    return sum(1 for first, second in combinations(sections, 2) if first.overlaps(second))
+
+
+def benchmark(filename="input.txt"):
+    """
+    Compares the pairwise overlaps count of SectionIndex against the naive Section.overlaps loop
+    """
+    index = SectionIndex.read(filename)
+    start = time.perf_counter()
+    naive = naive_pairwise_overlaps(index.sections)
+    print(f"naive: {time.perf_counter() - start:.3f}s")
+    start = time.perf_counter()
+    indexed = SectionIndex(index.sections).pairwise_overlaps()
+    print(f"indexed (including build): {time.perf_counter() - start:.3f}s")
+    assert naive == indexed
+
+
 assert count_fully_contains("test.txt") == 2
 assert count_overlaps("test.txt") == 4
 
@@ -61,4 +218,43 @@ count = count_fully_contains("input.txt")
 print(f"There are {count} assignment having one section that fully contains another")
 
 count = count_overlaps("input.txt")
-print(f"There are {count} assignment having one section overlapping another")
\ No newline at end of file
+print(f"There are {count} assignment having one section overlapping another")
+
+test_assignments = Assignments.read("test.txt")
+assert len(test_assignments) == 6
+assert test_assignments.low1[0] == 2
+assert test_assignments.high2[-1] == 8
+assert test_assignments.counts() == {"fully_contains": 2, "overlaps": 4}
+assert test_assignments.counts(
+    singles=lambda l1, h1, l2, h2: l1 == h1 or l2 == h2) == {"singles": 1}
+
+assert Assignments.read("input.txt").counts() == {
+    "fully_contains": count_fully_contains("input.txt"),
+    "overlaps": count,
+}
+
+test_index = SectionIndex.read("test.txt")
+assert len(test_index) == 12
+assert test_index.coverage(6) == 8
+assert test_index.coverage(1) == 0
+assert sorted((s.low, s.high) for s in test_index.stabbing(6)) == [
+    (2, 6), (2, 8), (3, 7), (4, 6), (4, 8), (5, 7), (6, 6), (6, 8)
+]
+assert sorted((s.low, s.high) for s in test_index.overlapping(1, 3)) == [
+    (2, 3), (2, 4), (2, 6), (2, 8), (3, 7)
+]
+assert test_index.count_overlapping(1, 3) == 5
+assert test_index.pairwise_overlaps() == naive_pairwise_overlaps(test_index.sections)
+assert SectionIndex([]).overlapping(1, 3) == []
+
+index = SectionIndex.read("input.txt")
+assert (SectionIndex(index.sections[:300]).pairwise_overlaps()
+        == naive_pairwise_overlaps(index.sections[:300]))
+for probe in range(0, 100, 7):
+    expected = [s for s in index.sections if s.overlaps(Section(probe, probe + 10))]
+    assert sorted(map(id, index.overlapping(probe, probe + 10))) == sorted(map(id, expected))
+    assert index.count_overlapping(probe, probe + 10) == len(expected)
+    assert index.coverage(probe) == len(index.stabbing(probe))
+
+if RUN_BENCHMARK:
+    benchmark()
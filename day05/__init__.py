@@ -30,15 +30,33 @@ class Crate:
         return f"[{self.content}]"
 
 
-class Stack(list):
-    pass
+class Stack(bytearray):
+    """
+    The crates of a stack, bottom first, stored as one byte each.
+    Indexing still provides Crate objects, but moves are done in bulk on the bytes.
+    """
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return Stack(super().__getitem__(item))
+        return Crate(chr(super().__getitem__(item)))
+
+    def move_to(self, other: 'Stack', quantity, reverse=True):
+        if quantity <= 0:
+            return
+        section = bytearray.__getitem__(self, slice(-quantity, None))
+        if reverse:
+            section.reverse()
+        other.extend(section)
+        del self[-quantity:]
 
 
 class CrateMover9000:
     pattern = re.compile(r'(?P<crate>\[(?P<content>\w)])')
+    reverses = True
 
     def __init__(self):
-        self.stacks = defaultdict(lambda: Stack())
+        self.stacks = defaultdict(Stack)
+        self.drawing = defaultdict(Stack)
 
     def parse_line(self, string):
         one_match = self.pattern.search(string)
@@ -48,12 +66,19 @@ class CrateMover9000:
         for i, col in enumerate(range(0, len(string), 4)):
             match = self.pattern.match(string[col:col+3])
             if match:
-                self.stacks[i].insert(0, Crate(match.group("content")))
+                self.drawing[i].append(ord(match.group("content")))
+
+    def end_drawing(self):
+        """
+        The drawing is read top first, so the parsed crates are flipped under the stacks once done
+        """
+        for i, crates in self.drawing.items():
+            crates.reverse()
+            self.stacks[i][:0] = crates
+        self.drawing.clear()
 
     def apply(self, p: Procedure):
-        for i in range(p.quantity):
-            self.stacks[p.target].append(self.stacks[p.source][-1])
-            self.stacks[p.source].pop()
+        self.stacks[p.source].move_to(self.stacks[p.target], p.quantity)
 
     def top(self):
         out = " " * (len(self.stacks))
@@ -65,12 +90,41 @@ class CrateMover9000:
             out = out[:k] + top + out[k+1:]
         return out
 
+    def trace_top(self, procedure):
+        """
+        Same result as top() after applying the whole procedure, but without moving any crate:
+        each final top crate is traced backward, as a (stack, depth from the top) position,
+        to the place it held in the initial drawing. Moves onto their own stack leave it as is
+        when applied, so they are skipped.
+        """
+        procedure = [p for p in procedure if p.source != p.target]
+        heights = {k: len(v) for k, v in self.stacks.items()}
+        for p in procedure:
+            heights[p.source] -= p.quantity
+            heights[p.target] = heights.get(p.target, 0) + p.quantity
+
+        traced = {k: (k, 0) for k, height in heights.items() if height > 0}
+        for p in reversed(procedure):
+            for k, (stack, depth) in traced.items():
+                if stack == p.target:
+                    if depth < p.quantity:
+                        traced[k] = p.source, p.quantity - 1 - depth if self.reverses else depth
+                    else:
+                        traced[k] = stack, depth - p.quantity
+                elif stack == p.source:
+                    traced[k] = stack, depth + p.quantity
+
+        out = [" "] * len(heights)
+        for k, (stack, depth) in traced.items():
+            out[k] = self.stacks[stack][-1 - depth].content
+        return "".join(out)
+
 
 class CrateMover9001(CrateMover9000):
+    reverses = False
+
     def apply(self, p: Procedure):
-        section = self.stacks[p.source][-p.quantity:]
-        del self.stacks[p.source][-p.quantity:]
-        self.stacks[p.target].extend(section)
+        self.stacks[p.source].move_to(self.stacks[p.target], p.quantity, reverse=False)
 
 
 def parse_file(cratemover, filename):
@@ -84,12 +138,76 @@ def parse_file(cratemover, filename):
                     procedure.append(Procedure.parse(line))
             except ValueError:
                 pass
+    cratemover.end_drawing()
 
     return procedure
 
 
+class Replay:
+    """
+    Answers "what did the stacks look like after procedure k" without replaying the whole file:
+    the stacks are snapshotted every `every` procedures, and a query replays from the nearest one.
+    A snapshot is a dict of immutable bytes, in which untouched stacks are shared with the previous
+    one.
+    """
+    def __init__(self, cratemover_class, filename, every=100):
+        if every < 1:
+            raise ValueError("Checkpoints must be at least 1 procedure apart")
+        self.cratemover_class = cratemover_class
+        self.every = every
+
+        cratemover = cratemover_class()
+        self.procedure = parse_file(cratemover, filename)
+        snapshot = {k: bytes(v) for k, v in cratemover.stacks.items()}
+        self.checkpoints = [snapshot]
+        dirty = set()
+        for i, p in enumerate(self.procedure, start=1):
+            cratemover.apply(p)
+            dirty.update((p.source, p.target))
+            if i % every == 0:
+                snapshot = dict(snapshot)
+                for k in dirty:
+                    snapshot[k] = bytes(cratemover.stacks[k])
+                dirty.clear()
+                self.checkpoints.append(snapshot)
+
+    def _restore(self, k):
+        if not 0 <= k <= len(self.procedure):
+            raise IndexError(f"There are only {len(self.procedure)} procedures")
+        cratemover = self.cratemover_class()
+        for i, crates in self.checkpoints[k // self.every].items():
+            cratemover.stacks[i] = Stack(crates)
+        return cratemover, self.procedure[k - k % self.every:k]
+
+    def state_after(self, k):
+        """A crate mover in the state reached after the first k procedures"""
+        cratemover, remaining = self._restore(k)
+        for p in remaining:
+            cratemover.apply(p)
+        return cratemover
+
+    def top_after(self, k):
+        cratemover, remaining = self._restore(k)
+        return cratemover.trace_top(remaining)
+
+
+test_stack = Stack(b"ABCD")
+assert test_stack[0] == "A"
+assert test_stack[-1].content == "D"
+assert test_stack[1:3] == Stack(b"BC")
+test_other = Stack(b"Z")
+test_stack.move_to(test_other, 3)
+assert test_stack == b"A"
+assert test_other == b"ZDCB"
+test_other.move_to(test_stack, 2, reverse=False)
+assert test_stack == b"ACB"
+assert test_other == b"ZD"
+
 test_mover_9000 = CrateMover9000()
 procedure = parse_file(test_mover_9000, "test.txt")
+assert test_mover_9000.trace_top(procedure) == "CMZ"
+assert test_mover_9000.trace_top(procedure[:1]) == "DCP"
+assert test_mover_9000.trace_top(procedure[:2]) == " CZ"
 assert len(procedure) == 4
 assert procedure[0].source == 1
 assert procedure[0].target == 0
@@ -135,6 +253,16 @@ assert test_mover_9000.top() == "CMZ"
 
 test_mover_9001 = CrateMover9001()
 procedure = parse_file(test_mover_9001, "test.txt")
+assert test_mover_9001.trace_top(procedure) == "MCD"
+
+for test_class in (CrateMover9000, CrateMover9001):
+    same_stack_mover = test_class()
+    same_stack_mover.stacks[0] = Stack(b"BA")
+    same_stack_mover.stacks[1] = Stack(b"C")
+    same_stack_procedure = [Procedure(2, 1, 1)]
+    assert same_stack_mover.trace_top(same_stack_procedure) == "AC"
+    same_stack_mover.apply(same_stack_procedure[0])
+    assert same_stack_mover.top() == "AC"
 
 test_mover_9001.apply(procedure[0])
 assert len(test_mover_9001.stacks[0]) == 3
@@ -182,14 +310,29 @@ assert test_mover_9001.stacks[2][0] == "P"
 
 assert test_mover_9001.top() == "MCD"
 
+test_replay = Replay(CrateMover9000, "test.txt", every=3)
+assert len(test_replay.checkpoints) == 2
+assert [test_replay.top_after(k) for k in range(5)] == ["NDP", "DCP", " CZ", "M Z", "CMZ"]
+assert test_replay.state_after(2).stacks[2] == b"PDNZ"
+assert test_replay.state_after(4).top() == "CMZ"
+assert Replay(CrateMover9001, "test.txt", every=1).state_after(4).top() == "MCD"
+
 crate_mover_9000 = CrateMover9000()
 procedure = parse_file(crate_mover_9000, "input.txt")
+traced_top = crate_mover_9000.trace_top(procedure)
 for p in procedure:
     crate_mover_9000.apply(p)
+assert traced_top == crate_mover_9000.top()
 print(f"Top most crates for a CrateMover 9000 after procedure are encoded as : {crate_mover_9000.top()}")
 
 crate_mover_9001 = CrateMover9001()
 procedure = parse_file(crate_mover_9001, "input.txt")
+traced_top = crate_mover_9001.trace_top(procedure)
 for p in procedure:
     crate_mover_9001.apply(p)
-print(f"Top most crates for a CrateMover 9001 after procedure are encoded as : {crate_mover_9001.top()}")
\ No newline at end of file
+assert traced_top == crate_mover_9001.top()
+print(f"Top most crates for a CrateMover 9001 after procedure are encoded as : {crate_mover_9001.top()}")
+
+replay = Replay(CrateMover9001, "input.txt", every=50)
+assert replay.top_after(len(procedure)) == crate_mover_9001.top()
+assert replay.state_after(len(procedure)).stacks == crate_mover_9001.stacks
@@ -1,3 +1,16 @@
+import io
+import mmap
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Value
+
+RUN_BENCHMARK = False
+
+_FOUND = None
+
+
 class DataStreamBuffer:
     def __init__(self, string):
         self.input = string
@@ -15,29 +28,193 @@ class DataStreamBuffer:
             yield list(self.input[i:i+size])
 
 
-test_buffer = DataStreamBuffer("abcdefghijkl")
-buffers = list(test_buffer.get_buffers(4))
-assert len(buffers) == 9
-assert buffers[0] == ["a", "b", "c", "d"]
-assert buffers[1] == ["b", "c", "d", "e"]
-assert buffers[8] == ["i", "j", "k", "l"]
-
-assert DataStreamBuffer("mjqjpqmgbljsphdztnvjfqwrcgsmlb").first_marker_after(4) == 7
-assert DataStreamBuffer("mjqjpqmgbljsphdztnvjfqwrcgsmlb").first_marker_after(14) == 19
-assert DataStreamBuffer("bvwbjplbgvbhsrlpgdmjqwftvncz").first_marker_after(4) == 5
-assert DataStreamBuffer("bvwbjplbgvbhsrlpgdmjqwftvncz").first_marker_after(14) == 23
-assert DataStreamBuffer("nppdvjthqldpwncqszvftbrmjlhg").first_marker_after(4) == 6
-assert DataStreamBuffer("nppdvjthqldpwncqszvftbrmjlhg").first_marker_after(14) == 23
-assert DataStreamBuffer("nznrnfrfntjfmvfwmzdfjlvtqnbhcprsg").first_marker_after(4) == 10
-assert DataStreamBuffer("nznrnfrfntjfmvfwmzdfjlvtqnbhcprsg").first_marker_after(14) == 29
-assert DataStreamBuffer("zcfzfwzzqfrljwzlrfnpqdbhtmscgvjw").first_marker_after(4) == 11
-assert DataStreamBuffer("zcfzfwzzqfrljwzlrfnpqdbhtmscgvjw").first_marker_after(14) == 26
-
-with open("input.txt", encoding="utf-8") as file:
-    buffer = file.readline()
-ds = DataStreamBuffer(buffer)
-
-print(f"Datastream buffer needed {ds.first_marker_after(4)} characters to be "
-      f"processed before the first start-of-packet marker was detected (4 chars buffer)")
-print(f"Datastream buffer needed {ds.first_marker_after(14)} characters to be "
-      f"processed before the first start-of-packet marker was detected (14 chars buffer)")
+class MarkerDetector:
+    """
+    Incremental marker detection over a datastream fed chunk by chunk, for several window sizes.
+    For each size, a sliding window keeps a count per byte value and the number of duplicated
+    values: a marker ends wherever that number drops to zero.
+    """
+    def __init__(self, sizes=(4, 14)):
+        self.sizes = tuple(sizes)
+        self.position = 0
+        self.tail = b""
+        self.counts = {size: [0] * 256 for size in self.sizes}
+        self.duplicates = dict.fromkeys(self.sizes, 0)
+
+    def feed(self, data: bytes):
+        """
+        Returns (size, marker) for every marker ending in data, marker being a 1-based position
+        """
+        buffer = self.tail + data
+        offset = self.position - len(self.tail)
+        found = []
+        for size in self.sizes:
+            counts = self.counts[size]
+            duplicates = self.duplicates[size]
+            for i in range(len(self.tail), len(buffer)):
+                char = buffer[i]
+                counts[char] += 1
+                if counts[char] == 2:
+                    duplicates += 1
+                if i + offset >= size:
+                    out = buffer[i - size]
+                    counts[out] -= 1
+                    if counts[out] == 1:
+                        duplicates -= 1
+                if not duplicates and i + offset >= size - 1:
+                    found.append((offset + i + 1, size))
+            self.duplicates[size] = duplicates
+
+        self.position += len(data)
+        self.tail = buffer[-max(self.sizes):]
+        return [(size, marker) for marker, size in sorted(found)]
+
+
+def iter_markers(stream, sizes=(4, 14), chunk_size=1 << 16):
+    """
+    Yields (size, marker) for every marker of a binary stream (file object, pipe or socket file)
+    """
+    detector = MarkerDetector(sizes)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        yield from detector.feed(chunk)
+
+
+def first_markers(stream, sizes=(4, 14), chunk_size=1 << 16):
+    """First marker of each window size, stopping reading as soon as all of them are found"""
+    markers = dict.fromkeys(sizes)
+    for size, marker in iter_markers(stream, sizes, chunk_size):
+        if markers[size] is None:
+            markers[size] = marker
+            if None not in markers.values():
+                break
+    return markers
+
+
+def parallel_first_marker(filename, size=4, workers=None, chunks_per_worker=4):
+    """
+    First marker of a datastream file, scanned by a pool of worker processes on a memory map.
+    The file is split in chunks overlapping by size - 1 bytes, and a worker gives up its chunk
+    as soon as a chunk of lower offset has found a marker.
+    """
+    length = os.path.getsize(filename)
+    if size > length:
+        raise ValueError
+    workers = workers or os.cpu_count()
+    count = workers * chunks_per_worker
+    bounds = sorted(set(length * i // count for i in range(count + 1)))
+    chunks = [(filename, index, start, end, size)
+              for index, (start, end) in enumerate(zip(bounds, bounds[1:]))]
+
+    found = Value("q", len(chunks))
+    if workers == 1:
+        _init_worker(found)
+        results = (_scan_chunk(*chunk) for chunk in chunks)
+        return next((marker for marker in results if marker is not None), None)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(found,)) as executor:
+        results = list(executor.map(_scan_chunk, *zip(*chunks)))
+    return next((marker for marker in results if marker is not None), None)
+
+
+def _init_worker(found):
+    global _FOUND  # pylint: disable=global-statement
+    _FOUND = found
+
+
+def _scan_chunk(filename, index, start, end, size, block_size=1 << 20):
+    """
+    First marker whose last character lies in [start, end), unless a previous chunk already has one
+    """
+    begin = max(start - size + 1, 0)
+    detector = MarkerDetector((size,))
+    with open(filename, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for position in range(begin, end, block_size):
+            if _FOUND.value < index:
+                return None
+            for _, marker in detector.feed(data[position:min(position + block_size, end)]):
+                with _FOUND.get_lock():
+                    _FOUND.value = min(_FOUND.value, index)
+                return begin + marker
+    return None
+
+
+def benchmark(length=20_000_000, workers=None):
+    """
+    Throughput of parallel_first_marker on a synthetic stream with a single marker at its very end
+    """
+    with tempfile.NamedTemporaryFile("wb", delete=False) as file:
+        file.write(b"abc" * (length // 3) + b"abcdefghijklmnopqrstuvwxyz")
+    try:
+        for count in range(1, (workers or os.cpu_count()) + 1):
+            start = time.perf_counter()
+            parallel_first_marker(file.name, size=14, workers=count)
+            elapsed = time.perf_counter() - start
+            print(f"{count} worker(s): {elapsed:.2f}s, {length / elapsed / 1e6:.1f}MB/s")
+    finally:
+        os.unlink(file.name)
+
+
+if __name__ == "__main__":
+    test_buffer = DataStreamBuffer("abcdefghijkl")
+    buffers = list(test_buffer.get_buffers(4))
+    assert len(buffers) == 9
+    assert buffers[0] == ["a", "b", "c", "d"]
+    assert buffers[1] == ["b", "c", "d", "e"]
+    assert buffers[8] == ["i", "j", "k", "l"]
+
+    assert DataStreamBuffer("mjqjpqmgbljsphdztnvjfqwrcgsmlb").first_marker_after(4) == 7
+    assert DataStreamBuffer("mjqjpqmgbljsphdztnvjfqwrcgsmlb").first_marker_after(14) == 19
+    assert DataStreamBuffer("bvwbjplbgvbhsrlpgdmjqwftvncz").first_marker_after(4) == 5
+    assert DataStreamBuffer("bvwbjplbgvbhsrlpgdmjqwftvncz").first_marker_after(14) == 23
+    assert DataStreamBuffer("nppdvjthqldpwncqszvftbrmjlhg").first_marker_after(4) == 6
+    assert DataStreamBuffer("nppdvjthqldpwncqszvftbrmjlhg").first_marker_after(14) == 23
+    assert DataStreamBuffer("nznrnfrfntjfmvfwmzdfjlvtqnbhcprsg").first_marker_after(4) == 10
+    assert DataStreamBuffer("nznrnfrfntjfmvfwmzdfjlvtqnbhcprsg").first_marker_after(14) == 29
+    assert DataStreamBuffer("zcfzfwzzqfrljwzlrfnpqdbhtmscgvjw").first_marker_after(4) == 11
+    assert DataStreamBuffer("zcfzfwzzqfrljwzlrfnpqdbhtmscgvjw").first_marker_after(14) == 26
+
+    for test_string, test_expected in [
+        ("mjqjpqmgbljsphdztnvjfqwrcgsmlb", {4: 7, 14: 19}),
+        ("bvwbjplbgvbhsrlpgdmjqwftvncz", {4: 5, 14: 23}),
+        ("nppdvjthqldpwncqszvftbrmjlhg", {4: 6, 14: 23}),
+        ("nznrnfrfntjfmvfwmzdfjlvtqnbhcprsg", {4: 10, 14: 29}),
+        ("zcfzfwzzqfrljwzlrfnpqdbhtmscgvjw", {4: 11, 14: 26}),
+    ]:
+        for test_chunk_size in [1, 3, 64]:
+            test_stream = io.BytesIO(test_string.encode())
+            assert first_markers(test_stream, chunk_size=test_chunk_size) == test_expected
+    assert first_markers(io.BytesIO(b"aaaa"), sizes=(2, 3)) == {2: None, 3: None}
+    test_detector = MarkerDetector((4,))
+    test_detector.feed(b"abcd")
+    assert test_detector.feed(b"efgh") == [(4, 5), (4, 6), (4, 7), (4, 8)]
+    assert list(iter_markers(io.BytesIO(b"aabca"), sizes=(1, 3), chunk_size=2)) == [
+        (1, 1), (1, 2), (1, 3), (1, 4), (3, 4), (1, 5), (3, 5)
+    ]
+
+    with open("input.txt", encoding="utf-8") as file:
+        buffer = file.readline()
+    ds = DataStreamBuffer(buffer)
+
+    print(f"Datastream buffer needed {ds.first_marker_after(4)} characters to be "
+          f"processed before the first start-of-packet marker was detected (4 chars buffer)")
+    print(f"Datastream buffer needed {ds.first_marker_after(14)} characters to be "
+          f"processed before the first start-of-packet marker was detected (14 chars buffer)")
+
+    with open("input.txt", "rb") as file:
+        assert first_markers(file, sizes=(4, 14)) == {4: ds.first_marker_after(4),
+                                                      14: ds.first_marker_after(14)}
+    for workers_count in range(1, 4):
+        for marker_size in (4, 14):
+            assert (parallel_first_marker("input.txt", marker_size, workers_count)
+                    == ds.first_marker_after(marker_size))
+
+    with tempfile.NamedTemporaryFile("wb", delete=False) as short_file:
+        short_file.write(b"mjqjpqmgbljsphdztnvjfqwrcgsmlb")
+    try:
+        assert parallel_first_marker(short_file.name, 14, workers=1, chunks_per_worker=64) == 19
+        assert parallel_first_marker(short_file.name, 14, workers=2, chunks_per_worker=32) == 19
+    finally:
+        os.unlink(short_file.name)
+
+    if RUN_BENCHMARK:
+        benchmark()
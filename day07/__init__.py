@@ -1,9 +1,21 @@
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+RUN_BENCHMARK = False
+
 
 class Node:
     def __init__(self, name):
         self.name = str(name)
         self.parent = None
         self.children = []
+        self.index = {}
 
     @property
     def path(self):
@@ -15,16 +27,26 @@ class Node:
         return len(self.children)
 
     def __getitem__(self, item):
-        for node in self.children:
-            if node.name == item:
-                return node
-        raise IndexError
+        try:
+            return self.index[item]
+        except KeyError:
+            raise IndexError(item) from None
 
     def add(self, other):
         if not isinstance(other, Node):
             raise ValueError
         other.parent = self
         self.children.append(other)
+        self.index.setdefault(other.name, other)
+
+        size = getattr(other, "size", 0)
+        node = self
+        while node is not None:
+            node.grow(size)
+            node = node.parent
+
+    def grow(self, size):
+        pass
 
     def directories(self, min_size=None, max_size=None):
         for child in self.children:
@@ -40,9 +62,19 @@ class Node:
 
 
 class Directory(Node):
+    """
+    A directory keeps the total size of its content, updated as soon as anything is added below it
+    """
+    def __init__(self, name):
+        super().__init__(name)
+        self._size = 0
+
     @property
     def size(self):
-        return sum(node.size for node in self.children)
+        return self._size
+
+    def grow(self, size):
+        self._size += size
 
 
 class File(Node):
@@ -77,6 +109,325 @@ def parser(filename):
     return root
 
 
+class SizeIndex:
+    """
+    Directories of an already parsed tree, sorted by size with prefix sums, so that threshold
+    queries are answered by bisection. It won't follow any change made to the tree afterwards.
+    """
+    def __init__(self, directories):
+        ordered = sorted(directories, key=lambda directory: directory.size)
+        self.directories = ordered
+        self.sizes = [directory.size for directory in ordered]
+        self.prefix = list(accumulate(self.sizes, initial=0))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def smallest_at_least(self, size):
+        i = bisect_left(self.sizes, size)
+        return self.directories[i] if i < len(self) else None
+
+    def count_at_most(self, size):
+        return bisect_right(self.sizes, size)
+
+    def sum_at_most(self, size):
+        return self.prefix[bisect_right(self.sizes, size)]
+
+    def largest(self, k):
+        if k <= 0:
+            return []
+        return self.directories[-k:][::-1]
+
+
+class CompactTree:
+    """
+    A whole filesystem stored as parallel arrays indexed by node number (0 being the root):
+    parent, first child and next sibling links, sizes, and name offsets in a shared pool.
+    Directory sizes are accumulated once, after parsing, and paths are only built on demand.
+    Nodes are browsed through CompactNode views.
+    """
+    def __init__(self):
+        self.parent = array("q", [-1])
+        self.first_child = array("q", [-1])
+        self.next_sibling = array("q", [-1])
+        self.size = array("q", [0])
+        self.is_directory = bytearray(b"\x01")
+        self.names = bytearray()
+        self.name_offsets = array("q", [0, 0])
+
+    def __len__(self):
+        return len(self.parent)
+
+    @property
+    def root(self) -> 'CompactNode':
+        return CompactNode(self, 0)
+
+    def name(self, index):
+        return self.names[self.name_offsets[index]:self.name_offsets[index + 1]].decode()
+
+    def path(self, index):
+        names = []
+        while index > 0:
+            names.append(self.name(index))
+            index = self.parent[index]
+        return "".join("/" + name for name in reversed(names))
+
+    def children(self, index):
+        child = self.first_child[index]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def _add(self, parent, name, size, last_child):
+        index = len(self)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.size.append(size or 0)
+        self.is_directory.append(size is None)
+        self.names += name.encode()
+        self.name_offsets.append(len(self.names))
+        if last_child.get(parent, -1) == -1:
+            self.first_child[parent] = index
+        else:
+            self.next_sibling[last_child[parent]] = index
+        last_child[parent] = index
+        return index
+
+    def _accumulate(self):
+        # a child is always numbered after its parent, so a reversed sweep is a post-order one
+        for index in range(len(self) - 1, 0, -1):
+            self.size[self.parent[index]] += self.size[index]
+
+    @classmethod
+    def read(cls, filename):
+        tree = cls()
+        directories = {}
+        last_child = {}
+        current = 0
+        with open(filename, encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if line.startswith("$ cd "):
+                    target = line[5:]
+                    if target == "/":
+                        current = 0
+                    elif target == "..":
+                        current = tree.parent[current]
+                    else:
+                        try:
+                            current = directories[current, target]
+                        except KeyError:
+                            raise IndexError(target) from None
+                elif line.startswith("$"):
+                    pass
+                else:
+                    size_or_dir, name = line.split(" ", 2)
+                    if size_or_dir == "dir":
+                        index = tree._add(current, name, None, last_child)
+                        directories.setdefault((current, name), index)
+                    else:
+                        tree._add(current, name, int(size_or_dir), last_child)
+        tree._accumulate()
+        return tree
+
+
+class CompactNode:
+    """A thin view over a CompactTree node, behaving like Node for browsing"""
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree: CompactTree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def name(self):
+        return self.tree.name(self.index)
+
+    @property
+    def path(self):
+        return self.tree.path(self.index)
+
+    @property
+    def size(self):
+        return self.tree.size[self.index]
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return CompactNode(self.tree, parent) if parent != -1 else None
+
+    @property
+    def is_directory(self):
+        return bool(self.tree.is_directory[self.index])
+
+    def __len__(self):
+        return sum(1 for _ in self.tree.children(self.index))
+
+    def __getitem__(self, item):
+        for child in self.tree.children(self.index):
+            if self.tree.name(child) == item:
+                return CompactNode(self.tree, child)
+        raise IndexError(item)
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactNode)
+                and (self.tree, self.index) == (other.tree, other.index))
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def directories(self, min_size=None, max_size=None):
+        """Same directories, in the same order, as Node.directories"""
+        tree = self.tree
+        pending = [(self.index, False)]
+        while pending:
+            index, visited = pending.pop()
+            if not visited:
+                pending.append((index, True))
+                pending.extend((child, False) for child in reversed(list(tree.children(index)))
+                               if tree.is_directory[child])
+                continue
+            size = tree.size[index]
+            if min_size is not None and size <= min_size:
+                continue
+            if max_size is not None and size >= max_size:
+                continue
+            yield CompactNode(tree, index)
+
+
+def stream_directory_sizes(filename, strict=False):
+    """
+    Yields (path, size) for every directory of a terminal log, without building any tree:
+    only the names and running totals of the current path are kept, so memory is bounded by
+    the tree depth, a directory being yielded once left.
+
+    The log must visit each directory once, depth first: entering again a directory already
+    left yields it twice, with partial totals. When strict, the names of the children already
+    left are kept at every level of the current path to raise a ValueError instead, memory
+    then being bounded by the directories width.
+    """
+    names = [""]
+    totals = [0]
+    left = [set()] if strict else None
+
+    def leave():
+        path = "/".join(names)
+        name = names.pop()
+        size = totals.pop()
+        if left is not None:
+            left.pop()
+        if totals:
+            totals[-1] += size
+            if left is not None:
+                left[-1].add(name)
+        return path, size
+
+    with open(filename, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith("$ cd "):
+                target = line[5:]
+                if target == "/":
+                    while len(names) > 1:
+                        yield leave()
+                elif target == "..":
+                    yield leave()
+                else:
+                    if left is not None:
+                        if target in left[-1]:
+                            raise ValueError(f"{'/'.join(names)}/{target} was already left, "
+                                             f"its total can't be streamed")
+                        left.append(set())
+                    names.append(target)
+                    totals.append(0)
+            elif line and not line.startswith(("$", "dir ")):
+                totals[-1] += int(line.split(" ", 1)[0])
+    while names:
+        yield leave()
+
+
+def stream_used_space(filename):
+    with open(filename, encoding="utf-8") as file:
+        return sum(int(line.split(" ", 1)[0]) for line in file if line[:1].isdigit())
+
+
+def stream_small_directories_total(filename, max_size):
+    return sum(size for _, size in stream_directory_sizes(filename) if size < max_size)
+
+
+def stream_directory_to_delete(filename, disk_size, required_free):
+    """
+    The (path, size) of the smallest directory freeing enough space, in two streaming passes:
+    the first one sums the used space, the second one looks for the directory.
+    """
+    missing = required_free - (disk_size - stream_used_space(filename))
+    return min(((path, size) for path, size in stream_directory_sizes(filename) if size > missing),
+               key=lambda directory: directory[1])
+
+
+def write_synthetic_log(filename, entries, depth=10):
+    """A terminal log listing about `entries` files and directories, browsed depth first"""
+    with open(filename, "w", encoding="utf-8") as file:
+        file.write("$ cd /\n")
+        written = 0
+        pending = [("", 0)]
+        while pending:
+            name, level = pending.pop()
+            if name is None:
+                file.write("$ cd ..\n")
+                continue
+            if name:
+                file.write(f"$ cd {name}\n")
+            file.write("$ ls\n")
+            directories = random.randint(2, 6) if level < depth and written < entries else 0
+            files = random.randint(1, 10)
+            for i in range(files):
+                file.write(f"{random.randint(1, 500000)} f{i}.txt\n")
+            for i in range(directories):
+                file.write(f"dir d{i}\n")
+            written += files + directories
+            for i in reversed(range(directories)):
+                pending.extend(((None, level), (f"d{i}", level + 1)))
+
+
+def benchmark_compact(entries=300_000):
+    """Memory per node and traversal time of CompactTree against the Node classes"""
+    with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as file:
+        write_synthetic_log(file.name, entries)
+    with open(file.name, encoding="utf-8") as log:
+        nodes = sum(1 for line in log if not line.startswith("$")) + 1
+    try:
+        for name, read in [("Node", parser), ("CompactTree", lambda f: CompactTree.read(f).root)]:
+            tracemalloc.start()
+            root = read(file.name)
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            start = time.perf_counter()
+            sum(d.size for d in root.directories(max_size=MAX_SIZE))
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {current / nodes:.0f} bytes per node, traversal in {elapsed:.2f}s")
+    finally:
+        os.unlink(file.name)
+
+
+def benchmark(entries=1_000_000):
+    """Times the parsing of a large synthetic log, and the day answers on the resulting tree"""
+    with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as file:
+        write_synthetic_log(file.name, entries)
+    try:
+        start = time.perf_counter()
+        root = parser(file.name)
+        print(f"parser: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        sum(d.size for d in root.directories(max_size=MAX_SIZE))
+        missing = REQUIRED_FREE - (DISK_SIZE - root.size)
+        min(d.size for d in root.directories(min_size=missing))
+        print(f"queries: {time.perf_counter() - start:.2f}s")
+    finally:
+        os.unlink(file.name)
+
+
 test_root = parser("test.txt")
 assert len(test_root) == 4
 assert len(test_root["a"]) == 4
@@ -86,6 +437,12 @@ assert test_root["a"]["e"].size == 584
 assert test_root["a"].size == 94853
 assert test_root["d"].size == 24933642
 assert test_root.size == 48381165
+assert test_root["a"].index["e"] is test_root["a"]["e"]
+try:
+    test_root["missing"]
+    assert False
+except IndexError:
+    pass
 
 MAX_SIZE = 100000
 test_large_dirs = list(test_root.directories(max_size=100000))
@@ -93,6 +450,49 @@ print(test_large_dirs)
 assert len(test_large_dirs) == 2
 assert test_root.size == 48381165
 
+test_sizes = list(stream_directory_sizes("test.txt"))
+assert test_sizes == [("/a/e", 584), ("/a", 94853), ("/d", 24933642), ("", 48381165)]
+assert stream_used_space("test.txt") == 48381165
+assert stream_small_directories_total("test.txt", MAX_SIZE) == 95437
+assert stream_directory_to_delete("test.txt", 70000000, 30000000) == ("/d", 24933642)
+
+with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as revisiting_log:
+    revisiting_log.write("$ cd /\n$ ls\ndir a\n$ cd a\n$ ls\ndir b\n60000 x\n$ cd ..\n"
+                         "$ cd a\n$ cd b\n$ ls\n60000 y\n")
+try:
+    assert [path for path, _ in stream_directory_sizes(revisiting_log.name)].count("/a") == 2
+    list(stream_directory_sizes(revisiting_log.name, strict=True))
+    assert False
+except ValueError:
+    pass
+finally:
+    os.unlink(revisiting_log.name)
+
+test_index = SizeIndex(test_root.directories())
+assert len(test_index) == 4
+assert test_index.sizes == [584, 94853, 24933642, 48381165]
+assert test_index.smallest_at_least(8381165).path == "/d"
+assert test_index.smallest_at_least(24933642).path == "/d"
+assert test_index.smallest_at_least(48381166) is None
+assert test_index.count_at_most(MAX_SIZE) == 2
+assert test_index.sum_at_most(MAX_SIZE) == 95437
+assert test_index.sum_at_most(0) == 0
+assert [d.path for d in test_index.largest(2)] == ["", "/d"]
+assert len(test_index.largest(10)) == 4
+assert test_index.largest(0) == []
+
+test_compact = CompactTree.read("test.txt")
+assert len(test_compact) == 14
+assert test_compact.root.size == 48381165
+assert test_compact.root["a"]["e"].size == 584
+assert test_compact.root["a"]["e"].path == "/a/e"
+assert test_compact.root["a"]["e"].parent == test_compact.root["a"]
+assert len(test_compact.root["a"]) == 4
+assert not test_compact.root["b.txt"].is_directory
+assert ([d.path for d in test_compact.root.directories()]
+        == [d.path for d in test_root.directories()])
+assert [d.path for d in test_compact.root.directories(max_size=MAX_SIZE)] == ["/a/e", "/a"]
+
 tree = parser("input.txt")
 small_dirs = list(tree.directories(max_size=MAX_SIZE))
 total_size = sum(d.size for d in small_dirs)
@@ -109,3 +509,22 @@ sorted_large_dirs = sorted(large_dirs, key=lambda x: x.size)
 smallest_of_the_largest = sorted_large_dirs[0]
 print(f"The directory we should delete is {smallest_of_the_largest.path}, "
       f"with a size of {smallest_of_the_largest.size}")
+
+assert stream_small_directories_total("input.txt", MAX_SIZE) == total_size
+assert stream_directory_to_delete("input.txt", DISK_SIZE, REQUIRED_FREE) == (
+    smallest_of_the_largest.path, smallest_of_the_largest.size
+)
+assert (sorted(stream_directory_sizes("input.txt", strict=True))
+        == sorted((d.path, d.size) for d in tree.directories()))
+
+size_index = SizeIndex(tree.directories())
+assert size_index.sum_at_most(MAX_SIZE - 1) == total_size
+assert size_index.smallest_at_least(missing_space + 1) is smallest_of_the_largest
+
+compact_tree = CompactTree.read("input.txt")
+assert ([(d.path, d.size) for d in compact_tree.root.directories()]
+        == [(d.path, d.size) for d in tree.directories()])
+
+if RUN_BENCHMARK:
+    benchmark()
+    benchmark_compact()
@@ -1,9 +1,20 @@
-from typing import List, Union
+import heapq
+import operator
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from colorama import Fore
 from colorama import Style
 
+RUN_BENCHMARK = False
+
 
 class Tree:
+    __slots__ = ("grid", "x", "y", "size")
+
     def __init__(self, grid, pos: (int, int), size: int):
         self.grid = grid
         self.x = pos[0]
@@ -30,15 +41,7 @@ class Tree:
 
     @property
     def score(self):
-        tscore = 1
-        for trees in [self.north, self.south, self.west, self.east]:
-            score = 0
-            for tree in trees:
-                score += 1
-                if tree.size >= self.size:
-                    break
-            tscore = tscore * score
-        return tscore
+        return self.grid.score_at(self.x, self.y)
 
     def print(self):
         if not self.visible:
@@ -49,16 +52,7 @@ class Tree:
 
     @property
     def visible(self):
-        if self.x in [0, self.grid.x - 1]:
-            return True
-
-        if self.y in [0, self.grid.y - 1]:
-            return True
-
-        return self.size > max((t.size for t in self.north), default=0) \
-            or self.size > max((t.size for t in self.south), default=0) \
-            or self.size > max((t.size for t in self.west), default=0) \
-            or self.size > max((t.size for t in self.east), default=0)
+        return self.grid.is_visible(self.x, self.y)
 
     @property
     def north(self):
@@ -77,98 +71,330 @@ class Tree:
         return [self.grid[x, self.y] for x in range(self.x + 1, self.grid.x)]
 
 
+def sweep_line(heights, line, visibility, scores):
+    """
+    Both ways, trees taller than the running maximum are visible from the line start, and the
+    viewing distance toward the line start is given by a stack of the trees not yet hidden by a
+    taller one
+    """
+    for index in line:
+        visibility[index] = 0
+        scores[index] = 1
+    for way in (line, line[::-1]):
+        tallest = -1
+        blocking = []
+        for i, index in enumerate(way):
+            size = heights[index]
+            if size > tallest:
+                visibility[index] = 1
+                tallest = size
+            while blocking and heights[way[blocking[-1]]] < size:
+                blocking.pop()
+            scores[index] *= i - (blocking[-1] if blocking else 0)
+            blocking.append(i)
+
+
+def _split(count, parts):
+    bounds = [count * i // parts for i in range(parts + 1)]
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+
+def _sweep_shared(names, width, height, kind, start, stop):
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    try:
+        heights = blocks[0].buf
+        if kind == "row":
+            visibility, scores = blocks[1].buf, blocks[3].buf.cast("q")
+            lines = [range(y * width, (y + 1) * width) for y in range(start, stop)]
+        else:
+            visibility, scores = blocks[2].buf, blocks[4].buf.cast("q")
+            lines = [range(x, width * height, width) for x in range(start, stop)]
+        for line in lines:
+            sweep_line(heights, line, visibility, scores)
+        scores.release()
+        del heights, visibility, scores
+    finally:
+        for block in blocks:
+            block.close()
+
+
 class Grid:
-    real_grid: List[List[Union[Tree, None]]]
+    """
+    A forest stored as one byte per tree, line after line like in the input file:
+    Tree objects are only created on access, as views over those bytes.
+    """
+    DIGITS = bytes.maketrans(b"0123456789", bytes(range(10)))
 
     def __init__(self, x, y):
         self.x = x
         self.y = y
-        self.grid = [[None] * x for _ in range(y)]
+        self.heights = bytearray(x * y)
+        self.row_visibility = self.column_visibility = None
+        self.row_scores = self.column_scores = None
+        self._visible_count = None
+        self.best_scores = None
+
+    def index(self, x, y):
+        return y * self.x + x
 
     def add(self, pos: (int, int), size: int):
-        self.grid[pos[0]][pos[1]] = Tree(self, pos, size)
+        self.heights[self.index(*pos)] = size
+        self.row_scores = None
+
+    @property
+    def visible_count(self):
+        if self.row_scores is None:
+            self.sweep()
+        return self._visible_count
+
+    def is_visible(self, x, y):
+        if self.row_scores is None:
+            self.sweep()
+        index = self.index(x, y)
+        return bool(self.row_visibility[index] or self.column_visibility[index])
+
+    def score_at(self, x, y):
+        if self.row_scores is None:
+            self.sweep()
+        index = self.index(x, y)
+        return self.row_scores[index] * self.column_scores[index]
+
+    def sweep(self):
+        """
+        Visibility and scenic score of every tree, in four directional sweeps over every line of
+        trees. Rows and columns results are kept apart so that an edit only needs its own row and
+        column swept again.
+        """
+        size = len(self.heights)
+        self.row_visibility = bytearray(size)
+        self.column_visibility = bytearray(size)
+        self.row_scores = array("q", [1]) * size
+        self.column_scores = array("q", [1]) * size
+        for y in range(self.y):
+            self._sweep_row(y)
+        for x in range(self.x):
+            self._sweep_column(x)
+        self._visible_count = sum(map(operator.or_, self.row_visibility, self.column_visibility))
+        self.best_scores = None
+
+    def _heap_scores(self):
+        self.best_scores = [(-self.score_at(x, y), x, y)
+                            for x in range(self.x) for y in range(self.y)]
+        heapq.heapify(self.best_scores)
+
+    def _sweep_row(self, y):
+        line = range(y * self.x, (y + 1) * self.x)
+        sweep_line(self.heights, line, self.row_visibility, self.row_scores)
+
+    def _sweep_column(self, x):
+        line = range(x, self.x * self.y, self.x)
+        sweep_line(self.heights, line, self.column_visibility, self.column_scores)
+
+    def parallel_sweep(self, workers=None):
+        """
+        Same as sweep, but rows and columns are split among a pool of worker processes, all reading
+        the heights from, and writing their results to, shared memory blocks
+        """
+        workers = workers or os.cpu_count()
+        size = len(self.heights)
+        blocks = [shared_memory.SharedMemory(create=True, size=max(block_size, 1))
+                  for block_size in (size, size, size, size * 8, size * 8)]
+        try:
+            blocks[0].buf[:size] = self.heights
+            names = [block.name for block in blocks]
+            tasks = [(names, self.x, self.y, "row", start, stop)
+                     for start, stop in _split(self.y, workers)]
+            tasks += [(names, self.x, self.y, "column", start, stop)
+                      for start, stop in _split(self.x, workers)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(_sweep_shared, *zip(*tasks)))
+
+            self.row_visibility = bytearray(blocks[1].buf[:size])
+            self.column_visibility = bytearray(blocks[2].buf[:size])
+            self.row_scores = array("q")
+            self.row_scores.frombytes(blocks[3].buf[:size * 8])
+            self.column_scores = array("q")
+            self.column_scores.frombytes(blocks[4].buf[:size * 8])
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        self._visible_count = sum(map(operator.or_, self.row_visibility, self.column_visibility))
+        self.best_scores = None
+
+    def set_height(self, x, y, size):
+        """
+        Changes a tree height, only sweeping again its row and its column, the only lines of sight
+        going through it, and updating the visible count and the scores heap, if already built,
+        accordingly
+        """
+        if self.row_scores is None:
+            self.sweep()
+        affected = [(i, y) for i in range(self.x)] + [(x, j) for j in range(self.y) if j != y]
+        self._visible_count -= sum(self.is_visible(*pos) for pos in affected)
+        self.heights[self.index(x, y)] = size
+        self._sweep_row(y)
+        self._sweep_column(x)
+        self._visible_count += sum(self.is_visible(*pos) for pos in affected)
+
+        if self.best_scores is None:
+            return
+        for pos in affected:
+            heapq.heappush(self.best_scores, (-self.score_at(*pos), *pos))
+        if len(self.best_scores) > 2 * len(self.heights):
+            self._heap_scores()
+
+    def best(self):
+        """
+        The tree with the best scenic score, from a heap of scores built on the first call,
+        outdated heap entries being dropped on the way
+        """
+        if self.row_scores is None:
+            self.sweep()
+        if self.best_scores is None:
+            self._heap_scores()
+        while True:
+            score, x, y = self.best_scores[0]
+            if -score == self.score_at(x, y):
+                return self[x, y]
+            heapq.heappop(self.best_scores)
 
     def __getitem__(self, item):
-        return self.grid[item[0]][item[1]]
+        return Tree(self, item, self.heights[self.index(*item)])
 
     def list(self, visible=None):
         return list(self.iter(visible))
 
     def iter(self, visible=None):
-        for row in self.grid:
-            for tree in row:
-                if visible is not None and visible != tree.visible:
+        for x in range(self.x):
+            for y in range(self.y):
+                if visible is not None and visible != self.is_visible(x, y):
                     continue
-                yield tree
+                yield self[x, y]
 
     @classmethod
     def read(cls, filename):
-        dimx = dimy = 0
-        with open(filename, encoding="utf-8") as file:
-            for x, line in enumerate(file.readlines()):
-                dimx = max(x + 1, dimx)
-                for y, char in enumerate(line.strip()):
-                    dimy = max(y + 1, dimy)
-        grid = cls(dimx, dimy)
-
-        with open(filename, encoding="utf-8") as file:
-            for y, line in enumerate(file.readlines()):
-                for x, char in enumerate(line.strip()):
-                    grid.add((x, y), int(char))
+        with open(filename, "rb") as file:
+            lines = file.read().split()
+        grid = cls(len(lines[0]), len(lines))
+        grid.heights[:] = b"".join(lines).translate(cls.DIGITS)
         return grid
 
     def print(self):
-        for row in self.grid:
-            for tree in row:
-                tree.print()
+        for x in range(self.x):
+            for y in range(self.y):
+                self[x, y].print()
             print("")
 
 
-test_grid = Grid.read("test.txt")
-assert test_grid[3, 1] == 1
-assert test_grid[3, 1].north[0] == 7
-assert test_grid[3, 1].south[0] == 3
-assert test_grid[3, 1].south[1] == 4
-assert test_grid[3, 1].south[2] == 9
-assert test_grid[3, 1].west[0] == 5
-assert test_grid[3, 1].west[1] == 5
-assert test_grid[3, 1].west[2] == 2
-assert test_grid[3, 1].east[0] == 2
-
-assert test_grid[0, 0] == 3
-assert test_grid[0, 0].visible
-assert test_grid[1, 1] == 5
-assert test_grid[1, 1].visible
-assert test_grid[2, 1] == 5
-assert test_grid[2, 1].visible
-assert test_grid[3, 1] == 1
-assert not test_grid[3, 1].visible
-assert test_grid[1, 2] == 5
-assert test_grid[1, 2].visible
-assert test_grid[2, 2] == 3
-assert not test_grid[2, 2].visible
-assert test_grid[3, 2] == 3
-assert test_grid[3, 2].visible
-assert test_grid[2, 3] == 5
-assert test_grid[2, 3].visible
-assert not test_grid[1, 3].visible
-assert not test_grid[3, 3].visible
-
-# assert test_grid[2, 1].score == 4
-assert test_grid[2, 3].score == 8
-
-print("Test plot")
-test_grid.print()
-
-visibles = list(test_grid.iter())
-assert len(list(test_grid.list(visible=True))) == 21
-
-print("Input plot")
-real_grid = Grid.read("input.txt")
-real_grid.print()
-
-visible_nb = len(real_grid.list(visible=True))
-print(f"There are {visible_nb} trees visible in the field")
-
-best = sorted(real_grid.list(), key=lambda x: x.score, reverse=True)[0]
-print(f"Best spot is ({best.x},{best.y}) with a wooping score of {best.score}")
+def benchmark(size=1000, workers=None):
+    """
+    Times the sweeps of a random size x size forest on a single process, then on 1 to N workers
+    """
+    grid = Grid(size, size)
+    grid.heights[:] = bytes(random.randrange(10) for _ in range(size * size))
+    start = time.perf_counter()
+    grid.sweep()
+    print(f"single process: {time.perf_counter() - start:.2f}s")
+    expected = grid.row_scores, grid.column_scores, grid.row_visibility, grid.column_visibility
+    for count in range(1, (workers or os.cpu_count()) + 1):
+        start = time.perf_counter()
+        grid.parallel_sweep(workers=count)
+        print(f"{count} worker(s): {time.perf_counter() - start:.2f}s")
+        assert (grid.row_scores, grid.column_scores,
+                grid.row_visibility, grid.column_visibility) == expected
+
+
+if __name__ == "__main__":
+    test_grid = Grid.read("test.txt")
+    assert len(test_grid.heights) == 25
+    assert test_grid.heights[:5] == bytes([3, 0, 3, 7, 3])
+    assert test_grid[3, 1] == 1
+    assert test_grid[3, 1].north[0] == 7
+    assert test_grid[3, 1].south[0] == 3
+    assert test_grid[3, 1].south[1] == 4
+    assert test_grid[3, 1].south[2] == 9
+    assert test_grid[3, 1].west[0] == 5
+    assert test_grid[3, 1].west[1] == 5
+    assert test_grid[3, 1].west[2] == 2
+    assert test_grid[3, 1].east[0] == 2
+
+    assert test_grid[0, 0] == 3
+    assert test_grid[0, 0].visible
+    assert test_grid[1, 1] == 5
+    assert test_grid[1, 1].visible
+    assert test_grid[2, 1] == 5
+    assert test_grid[2, 1].visible
+    assert test_grid[3, 1] == 1
+    assert not test_grid[3, 1].visible
+    assert test_grid[1, 2] == 5
+    assert test_grid[1, 2].visible
+    assert test_grid[2, 2] == 3
+    assert not test_grid[2, 2].visible
+    assert test_grid[3, 2] == 3
+    assert test_grid[3, 2].visible
+    assert test_grid[2, 3] == 5
+    assert test_grid[2, 3].visible
+    assert not test_grid[1, 3].visible
+    assert not test_grid[3, 3].visible
+
+    assert test_grid[2, 1].score == 4
+    assert test_grid[2, 3].score == 8
+
+    assert test_grid.visible_count == 21
+    assert test_grid.best().x == 2 and test_grid.best().y == 3
+    test_grid.set_height(3, 1, 8)
+    assert test_grid[3, 1].visible
+    assert test_grid.visible_count == 22
+    assert test_grid[3, 1].score == 1 * 3 * 3 * 1
+    assert test_grid[2, 1].score == 1 * 2 * 1 * 1
+    test_grid.set_height(2, 2, 9)
+    assert test_grid.best().x == 2 and test_grid.best().y == 2
+    assert test_grid.best().score == 2 * 2 * 2 * 2
+    test_grid.set_height(2, 2, 3)
+    test_grid.set_height(3, 1, 1)
+    assert test_grid.visible_count == 21
+    assert test_grid.best().score == 8
+
+    lazy_grid = Grid.read("test.txt")
+    lazy_grid.set_height(2, 2, 9)
+    assert lazy_grid.best_scores is None
+    assert lazy_grid.best().x == 2 and lazy_grid.best().y == 2
+
+    assert Grid.read("test.txt").visible_count == 21
+    edited_grid = Grid.read("test.txt")
+    assert edited_grid.visible_count == 21
+    edited_grid.add((3, 1), 8)
+    assert edited_grid.visible_count == 22
+
+    parallel_test_grid = Grid.read("test.txt")
+    parallel_test_grid.parallel_sweep(workers=3)
+    assert parallel_test_grid.visible_count == 21
+    assert ([(t.visible, t.score) for t in parallel_test_grid.iter()]
+            == [(t.visible, t.score) for t in test_grid.iter()])
+
+    print("Test plot")
+    test_grid.print()
+
+    visibles = list(test_grid.iter())
+    assert len(list(test_grid.list(visible=True))) == 21
+
+    print("Input plot")
+    real_grid = Grid.read("input.txt")
+    real_grid.print()
+
+    visible_nb = len(real_grid.list(visible=True))
+    assert visible_nb == real_grid.visible_count
+    print(f"There are {visible_nb} trees visible in the field")
+
+    best = sorted(real_grid.list(), key=lambda x: x.score, reverse=True)[0]
+    assert real_grid.best().score == best.score
+    print(f"Best spot is ({best.x},{best.y}) with a wooping score of {best.score}")
+
+    parallel_grid = Grid.read("input.txt")
+    parallel_grid.parallel_sweep(workers=2)
+    assert parallel_grid.visible_count == visible_nb
+    assert parallel_grid.best().score == best.score
+
+    if RUN_BENCHMARK:
+        benchmark()
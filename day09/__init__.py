@@ -1,6 +1,11 @@
+import random
+import time
+from array import array
 from enum import Enum
 from typing import Tuple, List
 
+RUN_BENCHMARK = False
+
 
 class Position:
     def __init__(self, x, y):
@@ -47,13 +52,71 @@ class Direction(Enum):
     LEFT = "L"
 
 
+class Retention(Enum):
+    """What a knot remembers of the positions it went through"""
+    NONE = "none"
+    DISTINCT = "distinct"
+    FULL = "full"
+
+
+class VisitedSet:
+    """
+    Distinct positions stored as bitmaps of 64x64 tiles, created as the area is visited:
+    memory is bound to the visited area, not to the number of steps.
+    """
+    TILE_BITS = 6
+
+    def __init__(self):
+        self.tiles = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _locate(self, x, y):
+        mask = (1 << self.TILE_BITS) - 1
+        bit = ((y & mask) << self.TILE_BITS) | (x & mask)
+        return pack(x >> self.TILE_BITS, y >> self.TILE_BITS), bit >> 3, 1 << (bit & 7)
+
+    def __contains__(self, coords):
+        key, offset, bit = self._locate(*coords)
+        tile = self.tiles.get(key)
+        return tile is not None and bool(tile[offset] & bit)
+
+    def add(self, x, y):
+        key, offset, bit = self._locate(x, y)
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = bytearray(1 << (2 * self.TILE_BITS - 3))
+        if not tile[offset] & bit:
+            tile[offset] |= bit
+            self.count += 1
+
+
 class Knot:
-    def __init__(self, name="H", pos: 'Position' = None):
+    def __init__(self, name="H", pos: 'Position' = None, retention: Retention = Retention.FULL):
         self.name = name
         self.pos = pos or Position(0, 0)
-        self.history = [self.pos.coords]
+        self.retention = retention
+        self.history = [] if retention == Retention.FULL else None
+        self.visited = VisitedSet() if retention == Retention.DISTINCT else None
+        self.record(self.pos)
         self.attached = None
 
+    def record(self, position: Position):
+        if self.history is not None:
+            self.history.append(position.coords)
+        elif self.visited is not None:
+            self.visited.add(position.x, position.y)
+
+    @property
+    def visited_count(self):
+        if self.history is not None:
+            return len(set(self.history))
+        if self.visited is not None:
+            return len(self.visited)
+        raise ValueError(f"Knot {self.name} doesn't retain its positions")
+
     def attach(self, knot: 'Knot'):
         self.attached = knot
 
@@ -61,12 +124,22 @@ class Knot:
         return f"{self.name} {self.pos}"
 
     def move(self, position: Position):
-        self.pos = position
-        self.history.append(position.coords)
-
-        if self.attached:
-            next_pos = self.attached.pos
-            self.attached.move(next_pos.follow(self.pos))
+        """
+        Moves the knot, then the knots attached behind it, one after the other. As a knot that
+        doesn't move keeps all the following ones still, the propagation stops there.
+        """
+        knot = self
+        while True:
+            knot.pos = position
+            knot.record(position)
+
+            follower = knot.attached
+            if not follower:
+                return
+            position = follower.pos.follow(knot.pos)
+            if position == follower.pos.coords:
+                return
+            knot = follower
 
     def apply_order(self, direction: Direction, distance: int):
         for _ in range(distance):
@@ -83,15 +156,20 @@ class Knot:
 
 
 class Rope(list):
-    def __init__(self, length=1):
+    def __init__(self, length=1, retention=Retention.FULL, tail_retention=None):
+        """
+        Knots remember their positions according to retention, except the tail using tail_retention
+        if any
+        """
         super().__init__()
-        self.append(Knot("H"))
+        self.append(Knot("H", retention=retention))
 
         if length <= 1:
             raise ValueError("Rope must at least be of length 1")
 
         for i in enumerate(range(length - 1), start=1):
-            knot = Knot(str(i))
+            last = i[0] == length - 1
+            knot = Knot(str(i), retention=(tail_retention or retention) if last else retention)
             self[-1].attach(knot)
             self.append(knot)
 
@@ -120,6 +198,134 @@ class Rope(list):
         return instructions
 
 
+DELTAS = {
+    Direction.UP.value: (0, 1),
+    Direction.DOWN.value: (0, -1),
+    Direction.RIGHT.value: (1, 0),
+    Direction.LEFT.value: (-1, 0),
+}
+
+# move of a knot, indexed by (dx + 2) * 5 + dy + 2, dx and dy being the offset to the knot
+# it follows
+FOLLOW_X = array("b", [0] * 25)
+FOLLOW_Y = array("b", [0] * 25)
+for follow_dx in range(-2, 3):
+    for follow_dy in range(-2, 3):
+        followed = Position(0, 0).follow(Position(follow_dx, follow_dy))
+        FOLLOW_X[(follow_dx + 2) * 5 + follow_dy + 2] = followed.x
+        FOLLOW_Y[(follow_dx + 2) * 5 + follow_dy + 2] = followed.y
+
+
+def pack(x, y):
+    """A position as a single int, to be stored in a set instead of a tuple"""
+    return (x << 32) | (y & 0xFFFFFFFF)
+
+
+class RopeEngine:
+    """
+    Same simulation as Rope, with all the knots coordinates in two flat arrays and a lookup table
+    to follow the previous knot. Once a step translated the whole rope, the configuration won't
+    change anymore, so the remaining steps in the same direction are fast-forwarded.
+
+    With every_knot, the distinct positions of every knot are kept as well: as knot i moves exactly
+    like the tail of a rope of length i + 1, a single run answers for every shorter rope.
+    """
+    def __init__(self, length=2, every_knot=False):
+        if length <= 1:
+            raise ValueError("Rope must at least be of length 1")
+        self.xs = array("q", [0] * length)
+        self.ys = array("q", [0] * length)
+        self.visited = {pack(0, 0)}
+        self.knots_visited = None
+        if every_knot:
+            self.knots_visited = [VisitedSet() for _ in range(length)]
+            for knot_visited in self.knots_visited:
+                knot_visited.add(0, 0)
+
+    @property
+    def visited_count(self):
+        return len(self.visited)
+
+    @property
+    def visited_counts(self):
+        """Distinct positions count of every knot, by index, the head being 0"""
+        if self.knots_visited is None:
+            raise ValueError("This engine doesn't keep track of every knot")
+        return [len(knot_visited) for knot_visited in self.knots_visited]
+
+    def step(self, dx, dy, count):
+        xs, ys = self.xs, self.ys
+        knots_visited = self.knots_visited
+        last = len(xs) - 1
+        while count > 0:
+            count -= 1
+            xs[0] += dx
+            ys[0] += dy
+            if knots_visited:
+                knots_visited[0].add(xs[0], ys[0])
+            translated = True
+            i = 1
+            while i <= last:
+                k = (xs[i - 1] - xs[i] + 2) * 5 + ys[i - 1] - ys[i] + 2
+                move_x = FOLLOW_X[k]
+                move_y = FOLLOW_Y[k]
+                if not move_x and not move_y:
+                    break
+                xs[i] += move_x
+                ys[i] += move_y
+                if knots_visited:
+                    knots_visited[i].add(xs[i], ys[i])
+                translated = translated and move_x == dx and move_y == dy
+                i += 1
+            if i <= last:
+                continue
+            self.visited.add(pack(xs[last], ys[last]))
+            if translated and count:
+                for j in range(last + 1):
+                    xs[j] += dx * count
+                    ys[j] += dy * count
+                    if knots_visited:
+                        for n in range(count):
+                            knots_visited[j].add(xs[j] - dx * n, ys[j] - dy * n)
+                self.visited.update(pack(xs[last] - dx * n, ys[last] - dy * n)
+                                    for n in range(count))
+                count = 0
+
+    def apply(self, filename):
+        with open(filename, encoding="utf-8") as file:
+            for line in file:
+                direction, distance = line.split(" ", maxsplit=2)
+                self.step(*DELTAS[direction], int(distance))
+        return self
+
+
+def visited_by_rope_length(filename, max_length):
+    """
+    Distinct positions visited by the tail of every rope from length 2 to max_length, in a single
+    run
+    """
+    counts = RopeEngine(max_length, every_knot=True).apply(filename).visited_counts
+    return {length: counts[length - 1] for length in range(2, max_length + 1)}
+
+
+def benchmark(lengths=(2, 10, 100, 1000, 10_000, 100_000), orders=2000):
+    """Times Rope and RopeEngine on the same random instructions for several rope lengths"""
+    instructions = [(random.choice("UDLR"), random.randint(1, 20)) for _ in range(orders)]
+    for length in lengths:
+        rope_object = Rope(length)
+        start = time.perf_counter()
+        rope_object._apply(instructions)
+        rope_elapsed = time.perf_counter() - start
+
+        engine = RopeEngine(length)
+        start = time.perf_counter()
+        for direction, distance in instructions:
+            engine.step(*DELTAS[direction], distance)
+        engine_elapsed = time.perf_counter() - start
+        assert engine.visited_count == len(set(rope_object.tail.history))
+        print(f"length {length}: Rope {rope_elapsed:.2f}s, RopeEngine {engine_elapsed:.2f}s")
+
+
 assert Position(0, 0).distance(Position(1, 1)) == 1
 assert Position(0, 0).distance(Position(2, 1)) == 2
 assert Position(0, 0).distance(Position(2, 2)) == 2
@@ -189,3 +395,54 @@ rope2 = Rope(10)
 rope2.apply("input.txt")
 visited = len(set(rope2.tail.history))
 print(f"A rope of 10, the tail visited {visited} distinct positions")
+
+for engine_length, engine_filename in [(2, "test.txt"), (10, "test.txt"), (10, "test.larger.txt")]:
+    test_engine = RopeEngine(engine_length).apply(engine_filename)
+    test_rope_check = Rope(engine_length)
+    test_rope_check.apply(engine_filename)
+    assert test_engine.visited_count == len(set(test_rope_check.tail.history))
+    assert (list(zip(test_engine.xs, test_engine.ys))
+            == [knot.pos.coords for knot in test_rope_check])
+assert RopeEngine(10).apply("test.larger.txt").visited_count == 36
+
+assert RopeEngine(2).apply("input.txt").visited_count == len(set(rope.tail.history))
+assert RopeEngine(10).apply("input.txt").visited_count == visited
+
+test_visited = VisitedSet()
+for test_coords in [(0, 0), (63, 63), (64, 0), (-1, -1), (0, 0), (-65, 200)]:
+    test_visited.add(*test_coords)
+assert len(test_visited) == 5
+assert len(test_visited.tiles) == 4
+assert (-1, -1) in test_visited
+assert (1, -1) not in test_visited
+
+light_rope = Rope(10, retention=Retention.NONE, tail_retention=Retention.DISTINCT)
+light_rope.apply("input.txt")
+assert light_rope.head.history is None and light_rope.head.visited is None
+assert light_rope.tail.visited_count == visited
+try:
+    light_rope.head.visited_count
+    assert False
+except ValueError:
+    pass
+
+test_by_length = visited_by_rope_length("test.larger.txt", 10)
+assert len(test_by_length) == 9
+assert test_by_length[10] == 36
+for engine_length in range(2, 10):
+    test_engine_run = RopeEngine(engine_length).apply("test.larger.txt")
+    assert test_by_length[engine_length] == test_engine_run.visited_count
+assert RopeEngine(3, every_knot=True).apply("test.txt").visited_counts[:2] == [
+    len(set(test_rope.head.history)), 13
+]
+
+by_length = visited_by_rope_length("input.txt", 10)
+assert by_length[2] == len(set(rope.tail.history))
+assert by_length[10] == visited
+
+long_rope = Rope(5000)
+long_rope.apply("input.txt")
+assert len(set(long_rope.tail.history)) == RopeEngine(5000).apply("input.txt").visited_count
+
+if RUN_BENCHMARK:
+    benchmark()
@@ -1,4 +1,6 @@
+from array import array
 from collections import defaultdict
+from itertools import accumulate
 
 
 class History(defaultdict):
@@ -54,6 +56,69 @@ class CPU:
                 method = getattr(self, line[0])
                 method(*line[1:])
 
+
+class Timeline:
+    """
+    A program compiled into the value of X during every cycle, so that any cycle is answered at
+    once. Every token of the program takes exactly one cycle ("noop", "addx", then the addx value),
+    and only the value tokens change X at the end of their cycle: X is the cumulative sum of those
+    deltas.
+    """
+    def __init__(self, values):
+        self.values = array("q", values)
+        self.x_prefix = array("q", accumulate(self.values, initial=0))
+        signals = (cycle * x for cycle, x in enumerate(self.values, start=1))
+        self.signal_prefix = array("q", accumulate(signals, initial=0))
+
+    def __len__(self):
+        """Number of cycles of the program, the last value being X once it is done"""
+        return len(self.values) - 1
+
+    @classmethod
+    def compile(cls, filename):
+        with open(filename, "rb") as file:
+            tokens = file.read().split()
+        deltas = (0 if token in (b"noop", b"addx") else int(token) for token in tokens)
+        return cls(accumulate(deltas, initial=1))
+
+    def _check(self, cycle):
+        """Cycles are counted from 1, up to the one following the last instruction"""
+        if not 1 <= cycle <= len(self.values):
+            raise IndexError(f"Cycle {cycle} is out of 1 to {len(self.values)}")
+
+    def x(self, cycle):
+        self._check(cycle)
+        return self.values[cycle - 1]
+
+    def signal(self, cycle):
+        self._check(cycle)
+        return cycle * self.values[cycle - 1]
+
+    def signal_sum(self, cycles=None):
+        """Sum of the signal strength over the given cycles, or the interesting ones"""
+        if cycles is None:
+            cycles = range(20, len(self) + 1, 40)
+        return sum(self.signal(cycle) for cycle in cycles)
+
+    def x_range_sum(self, start, stop):
+        """Sum of X during the cycles from start to stop excluded"""
+        self._check(start)
+        if stop < start:
+            raise IndexError(f"Range stop {stop} is before its start {start}")
+        if stop > start:
+            self._check(stop - 1)
+        return self.x_prefix[stop - 1] - self.x_prefix[start - 1]
+
+    def signal_range_sum(self, start, stop):
+        """Sum of the signal strength during the cycles from start to stop excluded"""
+        self._check(start)
+        if stop < start:
+            raise IndexError(f"Range stop {stop} is before its start {start}")
+        if stop > start:
+            self._check(stop - 1)
+        return self.signal_prefix[stop - 1] - self.signal_prefix[start - 1]
+
+
 class CRT:
     def __init__(self):
         self.register = Register()
@@ -95,4 +160,31 @@ assert test_cpu.history.signal_sum() == 13140
 
 cpu = CPU()
 cpu.run("input.txt")
-print(f"The sum of signal at interesting tick is {cpu.history.signal_sum()}")
\ No newline at end of file
+print(f"The sum of signal at interesting tick is {cpu.history.signal_sum()}")
+
+test_timeline = Timeline.compile("test.txt")
+assert len(test_timeline) == 240
+for test_cycle in range(20, 221, 40):
+    assert test_timeline.x(test_cycle) == test_cpu.history[test_cycle]["X"]
+    assert test_timeline.signal(test_cycle) == test_cpu.history[test_cycle]["signal"]
+assert test_timeline.signal_sum() == 13140
+assert test_timeline.signal_sum([20, 60]) == 420 + 1140
+assert test_timeline.x_range_sum(1, 241) == sum(test_timeline.x(c) for c in range(1, 241))
+assert test_timeline.signal_range_sum(10, 30) == sum(test_timeline.signal(c) for c in range(10, 30))
+
+for test_cycle in (0, -1, 242):
+    try:
+        test_timeline.x(test_cycle)
+        assert False
+    except IndexError:
+        pass
+for test_start, test_stop in ((0, 10), (-5, 10), (10, 243), (30, 10)):
+    try:
+        test_timeline.signal_range_sum(test_start, test_stop)
+        assert False
+    except IndexError:
+        pass
+assert test_timeline.x(241) == test_timeline.values[-1]
+assert test_timeline.x_range_sum(5, 5) == 0
+
+assert Timeline.compile("input.txt").signal_sum() == cpu.history.signal_sum()